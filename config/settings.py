@@ -17,7 +17,9 @@ if ALPHA_VANTAGE_API_KEY is None and FINANCE_API_SOURCE == 'alphavantage':
 
 # --- Data Configuration ---
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../data/')
-RAW_DATA_FILE = os.path.join(DATA_DIR, 'raw_market_data.pkl')
+RAW_DATA_FILE = os.path.join(DATA_DIR, 'raw_market_data.parquet')
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+CACHE_TTL_SECONDS = 24 * 60 * 60  # Re-fetch end-of-day data at most once a day
 
 # --- Market Data Parameters ---
 ASSET_SYMBOLS = ['SPY', 'QQQ', 'GLD', 'TLT', 'EEM', 'VNQ']
@@ -31,6 +33,9 @@ REGIME_THRESHOLD_LOW_VOL = 0.005
 
 # --- Optimization Parameters ---
 OPTIMIZATION_WINDOW = 60
+# Workers for per-date weight generation (-1 = all cores). Defaults to 1:
+# for short backtests the process pool startup outweighs the speedup.
+N_JOBS_WEIGHT_GENERATION = int(os.environ.get('OPTIMIZER_N_JOBS', '1'))
 RISK_FREE_RATE_ANNUAL = 0.02
 TARGET_RISK_ANNUAL = 0.15
 LAMBDA_RISK_AVERSION = 0.5
@@ -1,7 +1,92 @@
 
+import logging
+
 import pandas as pd
 import numpy as np
 from config import settings
+from src.numba_compat import njit
+
+logger = logging.getLogger(__name__)
+
+
+@njit(cache=True)
+def _simulate(prices: np.ndarray, weights: np.ndarray, rebalance_mask: np.ndarray,
+              initial_capital: float, cost_rate: float):
+    """
+    Share-based backtest simulation over C-contiguous (T, N) float64 arrays.
+
+    This is the path-dependent inner loop of run_backtest (holdings carry
+    over from day to day), kept free of any pandas or Python-object code so
+    Numba can compile it. Trades only happen on days flagged in
+    rebalance_mask; holdings drift with prices in between. On a rebalance
+    day sells execute first, then buys are scaled down proportionally if the
+    cash balance cannot cover them, so the result is independent of symbol
+    order.
+
+    Returns the per-day total value, cash balance, asset value, realized
+    weights, and a (T, N) matrix of shares that could not be bought for lack
+    of cash (0 where the trade went through in full).
+    """
+    num_days, num_assets = prices.shape
+    total_value = np.empty(num_days)
+    cash = np.empty(num_days)
+    asset_value = np.empty(num_days)
+    weight_history = np.empty((num_days, num_assets))
+    unfilled_buys = np.zeros((num_days, num_assets))
+
+    holdings = np.zeros(num_assets)
+    previous_weights = np.zeros(num_assets)
+    cash_balance = initial_capital
+
+    for i in range(num_days):
+        current_prices = prices[i]
+        target_weights = weights[i]
+
+        current_asset_values = holdings * current_prices
+        portfolio_value = current_asset_values.sum() + cash_balance
+
+        if rebalance_mask[i]:
+            trade_cost = np.abs(target_weights - previous_weights).sum() * portfolio_value * cost_rate
+            portfolio_value_after_cost = portfolio_value - trade_cost
+            cash_balance -= trade_cost
+
+            target_shares = (target_weights * portfolio_value_after_cost) / current_prices
+            shares_to_trade = target_shares - holdings
+
+            # Execute sells first (they only add cash), then scale the buys down
+            # proportionally if the cash balance cannot cover them all. Unlike a
+            # per-symbol check, the outcome does not depend on symbol order.
+            sells = np.minimum(shares_to_trade, 0.0)
+            buys = np.maximum(shares_to_trade, 0.0)
+            holdings += sells
+            cash_balance -= (sells * current_prices).sum()
+
+            buy_cost = (buys * current_prices).sum()
+            if buy_cost > 0.0:
+                scale = cash_balance / buy_cost
+                if scale > 1.0:
+                    scale = 1.0
+                elif scale < 0.0:
+                    scale = 0.0
+                if scale < 1.0:
+                    unfilled_buys[i] = buys * (1.0 - scale)
+                holdings += buys * scale
+                cash_balance -= buy_cost * scale
+
+        final_asset_value = (holdings * current_prices).sum()
+        final_portfolio_value = final_asset_value + cash_balance
+
+        total_value[i] = final_portfolio_value
+        cash[i] = cash_balance
+        asset_value[i] = final_asset_value
+        if final_portfolio_value != 0.0:
+            weight_history[i] = current_asset_values / final_portfolio_value
+        else:
+            weight_history[i] = 0.0
+        previous_weights[:] = weight_history[i]
+
+    return total_value, cash, asset_value, weight_history, unfilled_buys
+
 
 class Backtester:
     def __init__(self, initial_capital: float = settings.INITIAL_CAPITAL,
@@ -19,6 +104,9 @@ class Backtester:
     def _calculate_trade_cost(self, old_weights: np.ndarray, new_weights: np.ndarray, current_portfolio_value: float) -> float:
         """
         Calculates transaction costs based on the change in weights.
+
+        Reference implementation of the cost model inlined in the _simulate
+        kernel; takes plain ndarrays, no pandas state.
         """
         old_allocation = old_weights * current_portfolio_value
         new_allocation = new_weights * current_portfolio_value
@@ -26,86 +114,127 @@ class Backtester:
         total_cost = capital_traded * (self.transaction_cost_rate + self.slippage_rate)
         return total_cost
 
-    def run_backtest(self, df_prices: pd.DataFrame, df_optimal_weights: pd.DataFrame) -> pd.DataFrame:
+    def run_backtest_vectorized(self, df_prices: pd.DataFrame, df_optimal_weights: pd.DataFrame) -> pd.DataFrame:
+        """
+        Runs a fully vectorized, weight-based backtest on (T, N) NumPy matrices.
+
+        Instead of simulating share-by-share trades day by day, this fast path
+        treats the target weights as achieved each day and compounds the
+        portfolio value with vectorized NumPy operations:
+        turnover -> transaction/slippage drag -> cumulative growth multiplier.
+        It does not model the cash constraint of the share-based simulation in
+        run_backtest, so use it for quick strategy iteration and run_backtest
+        for the final, realistic numbers.
+        """
+        asset_symbols_ordered = settings.ASSET_SYMBOLS
+
+        # Align the two frames on their common dates without mutating the inputs
+        common_index = df_prices.index.intersection(df_optimal_weights.index)
+        prices = df_prices.loc[common_index, asset_symbols_ordered].to_numpy(dtype=np.float64)
+        weights = df_optimal_weights.loc[common_index, asset_symbols_ordered].to_numpy(dtype=np.float64)
+
+        # Drop any dates where a price or weight is missing
+        valid = ~(np.isnan(prices).any(axis=1) | np.isnan(weights).any(axis=1))
+        common_index = common_index[valid]
+        prices = prices[valid]
+        weights = weights[valid]
+
+        if len(common_index) == 0:
+            logger.warning("No overlapping dates between prices and weights.")
+            return pd.DataFrame()
+
+        logger.info(f"Starting vectorized backtest from {common_index.min().strftime('%Y-%m-%d')} to {common_index.max().strftime('%Y-%m-%d')}")
+
+        # Daily turnover: change in target weights vs the previous day (all-cash before day 0)
+        previous_weights = np.vstack([np.zeros((1, weights.shape[1])), weights[:-1]])
+        turnover = np.abs(weights - previous_weights).sum(axis=1)
+        cost_rate = self.transaction_cost_rate + self.slippage_rate
+
+        # Daily growth: market return earned on yesterday's weights, then trading drag
+        asset_returns = prices[1:] / prices[:-1] - 1.0
+        growth = np.empty(len(common_index))
+        growth[0] = 1.0 - cost_rate * turnover[0]
+        growth[1:] = (1.0 + (weights[:-1] * asset_returns).sum(axis=1)) * (1.0 - cost_rate * turnover[1:])
+
+        total_value = self.initial_capital * np.cumprod(growth)
+        asset_value = total_value * weights.sum(axis=1)
+        cash_balance = total_value - asset_value
+
+        # Build the output DataFrame once from the computed arrays
+        self.portfolio_history = pd.DataFrame(
+            np.column_stack([total_value, cash_balance, asset_value, weights]),
+            index=common_index,
+            columns=['Total_Value', 'Cash', 'Asset_Value'] + [f'Weight_{s}' for s in asset_symbols_ordered]
+        )
+        self.portfolio_history.index.name = 'Date'
+        logger.info("Vectorized backtest simulation completed.")
+        return self.portfolio_history
+
+    def run_backtest(self, df_prices: pd.DataFrame, df_optimal_weights: pd.DataFrame,
+                     rebalance_dates=None) -> pd.DataFrame:
         """
         Runs the portfolio backtest simulation by explicitly calculating shares to trade.
+
+        By default the portfolio rebalances to the target weights every day.
+        Pass `rebalance_dates` (anything convertible to a DatetimeIndex, e.g.
+        month starts) to trade only on those dates and let holdings drift in
+        between; each date is located on the sorted trading calendar with a
+        binary search (np.searchsorted), landing on the next trading day if
+        it falls on a holiday.
         """
-        portfolio_value = self.initial_capital
-        cash_balance = self.initial_capital
-        current_holdings = pd.Series(0.0, index=settings.ASSET_SYMBOLS)
-        
-        portfolio_history_list = []
-
-        # --- CORRECTED MERGE ---
-        # Concatenate the DataFrames along the columns, creating a MultiIndex to avoid column name conflicts
-        df_prices.columns = pd.MultiIndex.from_product([['Price'], df_prices.columns])
-        df_optimal_weights.columns = pd.MultiIndex.from_product([['Weight'], df_optimal_weights.columns])
-        df_merged = pd.concat([df_prices, df_optimal_weights], axis=1)
-        df_merged = df_merged.dropna()
-        # --- END CORRECTED MERGE ---
-        
         asset_symbols_ordered = settings.ASSET_SYMBOLS
 
-        print(f"Starting backtest from {df_merged.index.min().strftime('%Y-%m-%d')} to {df_merged.index.max().strftime('%Y-%m-%d')}")
+        # Align the two frames on their common dates and extract the price
+        # and weight matrices as C-contiguous float64 arrays - no merged
+        # MultiIndex copy, and the caller's frames are not mutated
+        common_index = df_prices.index.intersection(df_optimal_weights.index)
+        if len(common_index) == 0:
+            logger.warning("No overlapping dates between prices and weights.")
+            return pd.DataFrame()
 
-        previous_weights = pd.Series(0.0, index=asset_symbols_ordered)
-        trade_cost = 0.0
+        price_arr = np.ascontiguousarray(df_prices.loc[common_index, asset_symbols_ordered].to_numpy(dtype=np.float64))
+        weight_arr = np.ascontiguousarray(df_optimal_weights.loc[common_index, asset_symbols_ordered].to_numpy(dtype=np.float64))
+        dates = common_index
 
-        for i, (date, row) in enumerate(df_merged.iterrows()):
-            # --- CORRECTED SLICING ---
-            # Get current prices and target weights from the MultiIndex row
-            current_prices = row['Price']
-            target_weights = row['Weight']
-            # --- END CORRECTED SLICING ---
-            
-            if current_prices.isnull().any():
-                print(f"Skipping {date.strftime('%Y-%m-%d')} due to missing prices.")
-                continue
+        # Skip any dates with a missing price or weight before entering the
+        # kernel (the old dropna-on-merge semantics)
+        valid = ~(np.isnan(price_arr).any(axis=1) | np.isnan(weight_arr).any(axis=1))
+        if not valid.all():
+            for date in dates[~valid]:
+                logger.debug(f"Skipping {date.strftime('%Y-%m-%d')} due to missing prices or weights.")
+            price_arr = np.ascontiguousarray(price_arr[valid])
+            weight_arr = np.ascontiguousarray(weight_arr[valid])
+            dates = dates[valid]
 
-            current_asset_values = current_holdings * current_prices
-            portfolio_value = current_asset_values.sum() + cash_balance
+        logger.info(f"Starting backtest from {dates.min().strftime('%Y-%m-%d')} to {dates.max().strftime('%Y-%m-%d')}")
 
-            trade_cost = self._calculate_trade_cost(previous_weights.values, target_weights.values, portfolio_value)
-            
-            portfolio_value_after_cost = portfolio_value - trade_cost
-            cash_balance -= trade_cost
+        if rebalance_dates is None:
+            rebalance_mask = np.ones(len(dates), dtype=np.bool_)
+        else:
+            # Binary-search each rebalance date on the sorted trading
+            # calendar instead of scanning it
+            positions = np.searchsorted(dates.values, pd.DatetimeIndex(rebalance_dates).values)
+            positions = positions[positions < len(dates)]
+            rebalance_mask = np.zeros(len(dates), dtype=np.bool_)
+            rebalance_mask[positions] = True
 
-            target_shares = (target_weights * portfolio_value_after_cost) / current_prices
-            shares_to_trade = target_shares - current_holdings
-            
-            for symbol in asset_symbols_ordered:
-                if shares_to_trade[symbol] > 0:
-                    buy_amount = shares_to_trade[symbol] * current_prices[symbol]
-                    if cash_balance >= buy_amount:
-                        current_holdings[symbol] += shares_to_trade[symbol]
-                        cash_balance -= buy_amount
-                    else:
-                        print(f"Warning: Insufficient cash to buy {shares_to_trade[symbol]:.2f} of {symbol} on {date.strftime('%Y-%m-%d')}")
-
-                elif shares_to_trade[symbol] < 0:
-                    sell_amount = shares_to_trade[symbol] * current_prices[symbol]
-                    current_holdings[symbol] += shares_to_trade[symbol]
-                    cash_balance -= sell_amount
-            
-            final_asset_value = (current_holdings * current_prices).sum()
-            final_portfolio_value = final_asset_value + cash_balance
-
-            portfolio_history_list.append({
-                'Date': date,
-                'Total_Value': final_portfolio_value,
-                'Cash': cash_balance,
-                'Asset_Value': final_asset_value,
-                **{f'Weight_{s}': current_asset_values[s] / final_portfolio_value if final_portfolio_value != 0 else 0 for s in asset_symbols_ordered}
-            })
-            
-            current_weights = pd.Series(
-                [current_asset_values[s] / final_portfolio_value if final_portfolio_value != 0 else 0 for s in asset_symbols_ordered],
-                index=asset_symbols_ordered
-            )
-            previous_weights = current_weights.copy()
-            if final_portfolio_value == 0:
-                previous_weights.loc[:] = 0
-
-        self.portfolio_history = pd.DataFrame(portfolio_history_list).set_index('Date')
-        print("Backtest simulation completed with realistic share-based rebalancing.")
+        total_value, cash, asset_value, weight_history, unfilled_buys = _simulate(
+            price_arr, weight_arr, rebalance_mask, self.initial_capital,
+            self.transaction_cost_rate + self.slippage_rate
+        )
+
+        # Report the buys the simulation had to skip for lack of cash
+        for i, j in zip(*np.nonzero(unfilled_buys)):
+            logger.debug(f"Insufficient cash to buy {unfilled_buys[i, j]:.2f} of "
+                         f"{asset_symbols_ordered[j]} on {dates[i].strftime('%Y-%m-%d')}")
+
+        # One column_stack gives the DataFrame a single 2D block instead of
+        # N+3 separately assembled columns
+        self.portfolio_history = pd.DataFrame(
+            np.column_stack([total_value, cash, asset_value, weight_history]),
+            index=dates,
+            columns=['Total_Value', 'Cash', 'Asset_Value'] + [f'Weight_{s}' for s in asset_symbols_ordered]
+        )
+        self.portfolio_history.index.name = 'Date'
+        logger.info("Backtest simulation completed with realistic share-based rebalancing.")
         return self.portfolio_history
\ No newline at end of file
@@ -1,18 +1,55 @@
+import logging
+
 import pandas as pd
 import numpy as np
 import yfinance as yf
+import hashlib
 import os
 from datetime import datetime
 import time # For rate limiting
 
 from config import settings
+from src.market_panel import MarketPanel
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_file_path(symbol: str, start_date: datetime, end_date: datetime, interval: str) -> str:
+    """
+    Builds the on-disk cache path for one fetch request, keyed by a hash of
+    the request parameters.
+    """
+    key = hashlib.md5(f"{symbol}|{start_date:%Y-%m-%d}|{end_date:%Y-%m-%d}|{interval}".encode()).hexdigest()
+    return os.path.join(settings.CACHE_DIR, f"{key}.pkl")
+
+def _load_from_cache(cache_path: str) -> pd.DataFrame:
+    """
+    Returns the cached DataFrame if the cache file exists and is fresh,
+    otherwise an empty DataFrame.
+    """
+    if os.path.exists(cache_path) and (time.time() - os.path.getmtime(cache_path)) < settings.CACHE_TTL_SECONDS:
+        try:
+            return pd.read_pickle(cache_path)
+        except Exception as e:
+            logger.warning(f"Could not read cache file {cache_path}: {e}")
+    return pd.DataFrame()
+
+def _store_in_cache(df: pd.DataFrame, cache_path: str):
+    """
+    Writes a fetched DataFrame to the cache directory.
+    """
+    try:
+        os.makedirs(settings.CACHE_DIR, exist_ok=True)
+        df.to_pickle(cache_path)
+    except Exception as e:
+        logger.warning(f"Could not write cache file {cache_path}: {e}")
 
 def get_sample_data() -> pd.DataFrame:
     """
     Generates a hardcoded sample DataFrame with a MultiIndex for testing purposes.
     This bypasses the yfinance API to allow the backtest to run.
     """
-    print("Warning: Using hardcoded sample data for debugging purposes.")
+    logger.warning("Using hardcoded sample data for debugging purposes.")
     dates = pd.to_datetime(pd.date_range(start="2020-01-01", end="2022-01-01", freq="B"))
     num_assets = len(settings.ASSET_SYMBOLS)
     
@@ -59,69 +96,123 @@ def get_sample_data() -> pd.DataFrame:
 def fetch_historical_data(symbol: str, start_date: datetime, end_date: datetime, interval: str = '1d') -> pd.DataFrame:
     """
     Fetches historical OHLCV data for a single symbol from Yahoo Finance.
+    Results are cached on disk, so repeated runs within the cache TTL skip
+    the network call (and the rate-limit sleep) entirely.
     """
-    print(f"Fetching data for {symbol} from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
+    cache_path = _cache_file_path(symbol, start_date, end_date, interval)
+    cached = _load_from_cache(cache_path)
+    if not cached.empty:
+        logger.info(f"Loaded cached data for {symbol}.")
+        return cached
+
+    logger.info(f"Fetching data for {symbol} from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
     try:
         data = yf.download(symbol, start=start_date, end=end_date, interval=interval)
+        time.sleep(1) # Be nice to APIs, especially yfinance sometimes has limits
         if data.empty:
-            print(f"Warning: No data fetched for {symbol}.")
+            logger.warning(f"No data fetched for {symbol}.")
             return pd.DataFrame()
+        _store_in_cache(data, cache_path)
         return data
     except Exception as e:
-        print(f"Error fetching data for {symbol}: {e}")
+        logger.warning(f"Error fetching data for {symbol}: {e}")
         return pd.DataFrame()
 
 def fetch_multiple_assets_data(symbols: list, start_date: datetime, end_date: datetime, interval: str = '1d') -> pd.DataFrame:
     """
-    Fetches historical OHLCV data for multiple symbols and combines them into a MultiIndex DataFrame.
+    Fetches historical OHLCV data for multiple symbols in a single batched
+    yfinance request and returns a MultiIndex (Symbol, Metric) DataFrame.
+
+    One multi-ticker yf.download call replaces the old per-symbol loop, so
+    the network step costs one round trip instead of one per symbol (plus a
+    rate-limit sleep each). The batched result is cached on disk like the
+    single-symbol fetches; if the batched call fails, the per-symbol path is
+    used as a fallback.
     """
-    all_data = []
-    for symbol in symbols:
-        df = fetch_historical_data(symbol, start_date, end_date, interval)
-        if not df.empty:
-            df.columns = pd.MultiIndex.from_tuples([(symbol, col) for col in df.columns])
-            all_data.append(df)
-        time.sleep(1) # Be nice to APIs, especially yfinance sometimes has limits
+    cache_path = _cache_file_path('|'.join(symbols), start_date, end_date, interval)
+    combined_df = _load_from_cache(cache_path)
 
-    if not all_data:
-        print("No data fetched for any symbols.")
-        return pd.DataFrame()
+    if combined_df.empty:
+        logger.info(f"Fetching data for {len(symbols)} symbols from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...")
+        try:
+            combined_df = yf.download(symbols, start=start_date, end=end_date, interval=interval,
+                                      group_by='ticker', threads=True, progress=False)
+        except Exception as e:
+            logger.warning(f"Error fetching batched data: {e}")
+            combined_df = pd.DataFrame()
 
-    combined_df = pd.concat(all_data, axis=1)
-    
-    combined_df = combined_df.sort_index(axis=1, level=[0,1])
+        if combined_df.empty:
+            # Fall back to fetching one symbol at a time
+            logger.warning("Batched download failed, falling back to per-symbol fetching.")
+            all_data = []
+            for symbol in symbols:
+                df = fetch_historical_data(symbol, start_date, end_date, interval)
+                if not df.empty:
+                    df.columns = pd.MultiIndex.from_tuples([(symbol, col) for col in df.columns])
+                    all_data.append(df)
+
+            if not all_data:
+                logger.warning("No data fetched for any symbols.")
+                return pd.DataFrame()
+
+            combined_df = pd.concat(all_data, axis=1)
+
+        combined_df = combined_df.sort_index(axis=1, level=[0,1])
+        _store_in_cache(combined_df, cache_path)
+    else:
+        logger.info(f"Loaded cached data for {len(symbols)} symbols.")
 
-    print(f"Combined data for {len(symbols)} assets from {combined_df.index.min().strftime('%Y-%m-%d')} to {combined_df.index.max().strftime('%Y-%m-%d')}")
+    logger.info(f"Combined data for {len(symbols)} assets from {combined_df.index.min().strftime('%Y-%m-%d')} to {combined_df.index.max().strftime('%Y-%m-%d')}")
     return combined_df
 
+def fetch_market_panel(symbols: list, start_date: datetime, end_date: datetime, interval: str = '1d') -> MarketPanel:
+    """
+    Fetches historical data for multiple symbols and returns it as a
+    MarketPanel (one contiguous ndarray per metric) instead of a MultiIndex
+    DataFrame, ready for the numerical pipeline.
+    """
+    df = fetch_multiple_assets_data(symbols, start_date, end_date, interval)
+    if df.empty:
+        raise ValueError("No market data fetched, cannot build a MarketPanel.")
+    return MarketPanel.from_dataframe(df)
+
 def save_data(df: pd.DataFrame, file_path: str):
     """
-    Saves a DataFrame to a Pickle file, but only if it's not empty.
+    Saves a DataFrame to a compressed Parquet file, but only if it's not empty.
+    Parquet's columnar layout compresses far better than pickle and lets
+    load_data read back only the columns it needs.
     """
     if df.empty:
-        print("Warning: DataFrame is empty, not saving.")
+        logger.warning("DataFrame is empty, not saving.")
         return
-        
+
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    df.to_pickle(file_path)
-    print(f"Data saved to {file_path}")
+    df.to_parquet(file_path, engine='pyarrow', compression='zstd')
+    logger.info(f"Data saved to {file_path}")
 
-def load_data(file_path: str) -> pd.DataFrame:
+def load_data(file_path: str, columns: list = None) -> pd.DataFrame:
     """
-    Loads a DataFrame from a Pickle file with validation.
+    Loads a DataFrame from a Parquet file with validation.
+
+    Pass `columns` as a list of (symbol, metric) tuples to read just those
+    columns from disk, e.g. only the 'Close' columns for the backtest,
+    instead of materializing the full OHLCV panel in memory.
     """
     if not os.path.exists(file_path):
-        print(f"Error: File not found at {file_path}")
+        logger.warning(f"File not found at {file_path}")
         return pd.DataFrame()
-    
+
     try:
-        df = pd.read_pickle(file_path)
+        if columns is not None:
+            # Parquet stores MultiIndex columns under their stringified tuple names
+            columns = [str(tuple(col)) if not isinstance(col, str) else col for col in columns]
+        df = pd.read_parquet(file_path, engine='pyarrow', columns=columns)
         if not df.empty and isinstance(df.columns, pd.MultiIndex) and 'Close' in df.columns.get_level_values(1):
-            print(f"Data loaded from {file_path}.")
+            logger.info(f"Data loaded from {file_path}.")
             return df
         else:
-            print(f"Error: Loaded DataFrame is invalid. It might be empty or corrupt.")
+            logger.warning("Loaded DataFrame is invalid. It might be empty or corrupt.")
             return pd.DataFrame()
     except Exception as e:
-        print(f"Error loading pickle file: {e}")
+        logger.warning(f"Error loading parquet file: {e}")
         return pd.DataFrame()
\ No newline at end of file
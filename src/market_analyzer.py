@@ -1,26 +1,93 @@
+import logging
+
 import pandas as pd
 import numpy as np
 from config import settings
+from src.numba_compat import njit, NUMBA_AVAILABLE
+
+logger = logging.getLogger(__name__)
+
+# Integer regime codes. Regimes are stored as int8 instead of Python strings:
+# the series is ~8x smaller and downstream dispatch compares integers rather
+# than strings. REGIME_LABELS maps codes back to the display names.
+REGIME_LOW_VOL = 0
+REGIME_NORMAL_VOL = 1
+REGIME_HIGH_VOL = 2
+REGIME_LABELS = {REGIME_LOW_VOL: 'Low_Vol', REGIME_NORMAL_VOL: 'Normal_Vol', REGIME_HIGH_VOL: 'High_Vol'}
+REGIME_CODES = {label: code for code, label in REGIME_LABELS.items()}
+
+
+@njit(cache=True)
+def _fused_avg_rolling_std(returns: np.ndarray, window: int) -> np.ndarray:
+    """
+    Average across assets of the rolling sample std, fused into one pass.
+
+    Keeps sliding per-column sums and sums of squares, so each step costs
+    O(N) updates instead of re-scanning the whole window, and no (T, N)
+    intermediate std matrix is ever allocated. NaN entries (missing prices
+    yield NaN returns) are excluded from the sliding sums; a column's std
+    is only emitted once its window holds `window` valid values and the
+    cross-asset average skips NaN columns, matching pandas'
+    rolling(window).std() + mean(axis=1, skipna=True) exactly. Entries
+    before the first full window are NaN, also matching pandas.
+    """
+    num_rows, num_assets = returns.shape
+    out = np.full(num_rows, np.nan)
+    col_sum = np.zeros(num_assets)
+    col_sumsq = np.zeros(num_assets)
+    col_count = np.zeros(num_assets, dtype=np.int64)
+
+    for t in range(num_rows):
+        for j in range(num_assets):
+            x = returns[t, j]
+            if not np.isnan(x):
+                col_sum[j] += x
+                col_sumsq[j] += x * x
+                col_count[j] += 1
+            if t >= window:
+                y = returns[t - window, j]
+                if not np.isnan(y):
+                    col_sum[j] -= y
+                    col_sumsq[j] -= y * y
+                    col_count[j] -= 1
+
+        if t >= window - 1:
+            total = 0.0
+            num_valid = 0
+            for j in range(num_assets):
+                if col_count[j] < window:  # min_periods=window semantics
+                    continue
+                variance = (col_sumsq[j] - col_sum[j] * col_sum[j] / window) / (window - 1)
+                if variance < 0.0:
+                    variance = 0.0  # Guard against sliding-sum roundoff
+                total += np.sqrt(variance)
+                num_valid += 1
+            if num_valid > 0:
+                out[t] = total / num_valid
+
+    return out
 
 def calculate_returns(df_prices: pd.DataFrame | pd.Series) -> pd.DataFrame | pd.Series:
     """
     Calculates daily logarithmic returns for a DataFrame or Series.
     Input df_prices should be a DataFrame with asset symbols as columns or a Series of prices.
     """
+    # np.log(p[1:] / p[:-1]) on the raw array works on two views and yields
+    # exactly T-1 rows: no shifted full-size intermediate, no NaN head, and
+    # therefore no dropna scan (prices are assumed clean, as fetched).
     if isinstance(df_prices, pd.Series):
-        # If the input is a Series, just calculate the returns on it directly
-        log_returns = np.log(df_prices / df_prices.shift(1))
-        print("Calculated logarithmic returns for a Series.")
-        return log_returns.dropna()
+        prices = df_prices.to_numpy(dtype=np.float64)
+        log_returns = pd.Series(np.log(prices[1:] / prices[:-1]),
+                                index=df_prices.index[1:], name=df_prices.name)
+        logger.debug("Calculated logarithmic returns for a Series.")
+        return log_returns
     elif isinstance(df_prices, pd.DataFrame):
-        # If the input is a DataFrame, iterate through columns as before
-        log_returns = pd.DataFrame(index=df_prices.index)
-        for symbol in df_prices.columns:
-            log_returns[symbol] = np.log(df_prices[symbol] / df_prices[symbol].shift(1))
-        
+        prices = df_prices.to_numpy(dtype=np.float64)
+        log_returns = pd.DataFrame(np.log(prices[1:] / prices[:-1]),
+                                   index=df_prices.index[1:], columns=df_prices.columns)
         log_returns.columns.name = 'Symbol'
-        print("Calculated logarithmic returns for a DataFrame.")
-        return log_returns.dropna()
+        logger.debug("Calculated logarithmic returns for a DataFrame.")
+        return log_returns
     else:
         raise TypeError("Input must be a Pandas Series or DataFrame.")
 
@@ -32,25 +99,37 @@ def calculate_volatility(df_returns: pd.DataFrame, window: int = settings.VOL_WI
     if df_returns.empty:
         return pd.Series(dtype=float)
 
-    individual_asset_vol = df_returns.rolling(window=window).std()
-    
-    avg_asset_daily_vol = individual_asset_vol.mean(axis=1)
+    if NUMBA_AVAILABLE:
+        # Fused kernel: one pass, no intermediate (T, N) rolling-std matrix.
+        # Layout invariant: the kernel walks the matrix row by row (one day
+        # at a time across all assets), so it gets a C-ordered array; the
+        # column-wise covariance GEMM in portfolio_optimizer uses F order.
+        vol = _fused_avg_rolling_std(
+            np.ascontiguousarray(df_returns.to_numpy(dtype=np.float64)), window
+        )
+        avg_asset_daily_vol = pd.Series(vol, index=df_returns.index)
+    else:
+        individual_asset_vol = df_returns.rolling(window=window).std()
+        avg_asset_daily_vol = individual_asset_vol.mean(axis=1)
 
-    print(f"Calculated rolling daily volatility over {window} days.")
+    logger.debug(f"Calculated rolling daily volatility over {window} days.")
     return avg_asset_daily_vol.dropna()
 
 def identify_regimes(df: pd.DataFrame, vol_col: str = 'Volatility',
                      high_threshold: float = settings.REGIME_THRESHOLD_HIGH_VOL,
                      low_threshold: float = settings.REGIME_THRESHOLD_LOW_VOL) -> pd.Series:
     """
-    Classifies each period into a volatility regime (Low_Vol, Normal_Vol, High_Vol).
+    Classifies each period into a volatility regime, returned as an int8
+    Series of regime codes (REGIME_LOW_VOL / REGIME_NORMAL_VOL /
+    REGIME_HIGH_VOL). Use REGIME_LABELS to map codes to display names.
     """
     if vol_col not in df.columns:
         raise ValueError(f"DataFrame must contain a '{vol_col}' column.")
 
-    regime = pd.Series('Normal_Vol', index=df.index, dtype=str)
-    regime[df[vol_col] >= high_threshold] = 'High_Vol'
-    regime[df[vol_col] <= low_threshold] = 'Low_Vol'
+    vol = df[vol_col].to_numpy(dtype=np.float64)
+    codes = np.where(vol >= high_threshold, REGIME_HIGH_VOL,
+                     np.where(vol <= low_threshold, REGIME_LOW_VOL, REGIME_NORMAL_VOL)).astype(np.int8)
+    regime = pd.Series(codes, index=df.index)
 
-    print("Identified volatility regimes.")
+    logger.debug("Identified volatility regimes.")
     return regime
\ No newline at end of file
@@ -0,0 +1,70 @@
+import pandas as pd
+import numpy as np
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MarketPanel:
+    """
+    Structure-of-arrays view of the market data.
+
+    Instead of a (Symbol, Metric) MultiIndex DataFrame, which pays MultiIndex
+    resolution and block-manager copies on every access, each metric is held
+    as one C-contiguous (T, N) float64 ndarray with a shared date index and
+    symbol order. The numerical pipeline (returns, volatility, backtest
+    kernels) works directly on these arrays; to_dataframe() rebuilds the
+    familiar MultiIndex frame for reporting and plotting.
+    """
+    dates: pd.DatetimeIndex
+    symbols: list
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    symbol_index: dict = field(init=False)
+
+    def __post_init__(self):
+        self.symbol_index = {symbol: j for j, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'MarketPanel':
+        """
+        Builds a MarketPanel from a (Symbol, Metric) MultiIndex DataFrame,
+        such as the one returned by data_fetcher.fetch_multiple_assets_data.
+        """
+        if df.empty or not isinstance(df.columns, pd.MultiIndex):
+            raise ValueError("Input must be a non-empty DataFrame with (Symbol, Metric) MultiIndex columns.")
+
+        symbols = list(df.columns.get_level_values(0).unique())
+        arrays = {}
+        for metric in ['Open', 'High', 'Low', 'Close', 'Volume']:
+            columns = [(symbol, metric) for symbol in symbols]
+            arrays[metric.lower()] = np.ascontiguousarray(
+                df.reindex(columns=columns).to_numpy(dtype=np.float64)
+            )
+        return cls(dates=df.index, symbols=symbols, **arrays)
+
+    def log_returns(self) -> np.ndarray:
+        """
+        Daily log returns of the close prices as a (T-1, N) ndarray.
+        """
+        return np.log(self.close[1:] / self.close[:-1])
+
+    def close_frame(self) -> pd.DataFrame:
+        """
+        The close prices as a plain (date x symbol) DataFrame.
+        """
+        return pd.DataFrame(self.close, index=self.dates, columns=self.symbols)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Rebuilds the (Symbol, Metric) MultiIndex DataFrame for reporting.
+        """
+        metrics = ['Open', 'High', 'Low', 'Close', 'Volume']
+        data = np.column_stack([
+            getattr(self, metric.lower())[:, j]
+            for j in range(len(self.symbols)) for metric in metrics
+        ])
+        columns = pd.MultiIndex.from_product([self.symbols, metrics])
+        return pd.DataFrame(data, index=self.dates, columns=columns)
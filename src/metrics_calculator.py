@@ -1,6 +1,108 @@
 import pandas as pd
 import numpy as np
 from config import settings
+from src.numba_compat import njit, NUMBA_AVAILABLE
+
+
+@njit(cache=True)
+def _summary_kernel(values: np.ndarray, daily_risk_free_rate: float):
+    """
+    Single pass over a value series accumulating everything the performance
+    summary needs: running max / max drawdown, sums and sums of squares of
+    the daily returns and excess returns, and the downside accumulators for
+    the Sortino ratio. One traversal replaces the separate pct_change,
+    cummax, cumprod, mean, and std scans.
+    """
+    num_returns = values.shape[0] - 1
+    running_max = values[0]
+    max_drawdown = 0.0
+    sum_r = 0.0
+    sum_r2 = 0.0
+    sum_e = 0.0
+    sum_e2 = 0.0
+    sum_neg = 0.0
+    sum_neg2 = 0.0
+    num_neg = 0
+
+    for t in range(1, values.shape[0]):
+        value = values[t]
+        if value > running_max:
+            running_max = value
+        drawdown = (value - running_max) / running_max
+        if drawdown < max_drawdown:
+            max_drawdown = drawdown
+
+        daily_return = value / values[t - 1] - 1.0
+        excess = daily_return - daily_risk_free_rate
+        sum_r += daily_return
+        sum_r2 += daily_return * daily_return
+        sum_e += excess
+        sum_e2 += excess * excess
+        if excess < 0.0:
+            sum_neg += excess
+            sum_neg2 += excess * excess
+            num_neg += 1
+
+    return num_returns, sum_r, sum_r2, sum_e, sum_e2, num_neg, sum_neg, sum_neg2, max_drawdown
+
+
+def _sample_std(sum_x: float, sum_x2: float, n: int) -> float:
+    """Sample standard deviation (ddof=1) from running sums."""
+    if n < 2:
+        return np.nan
+    variance = (sum_x2 - sum_x * sum_x / n) / (n - 1)
+    return np.sqrt(variance) if variance > 0 else 0.0
+
+
+def _one_pass_summary(portfolio_values: pd.Series, risk_free_rate_annual: float,
+                      annualization_factor: int = 252) -> dict:
+    """
+    Computes all summary metrics for one value series from a single pass.
+    Matches the individual calculate_* functions, including their edge cases.
+    """
+    values = portfolio_values.to_numpy(dtype=np.float64)
+    daily_risk_free_rate = (1 + risk_free_rate_annual)**(1 / annualization_factor) - 1
+    (n, sum_r, sum_r2, sum_e, sum_e2,
+     num_neg, sum_neg, sum_neg2, max_dd) = _summary_kernel(values, daily_risk_free_rate)
+
+    if n < 1:
+        return {'cumulative_return': np.nan, 'annualized_return': np.nan,
+                'annualized_volatility': np.nan, 'max_drawdown': np.nan,
+                'sharpe': np.nan, 'calmar': np.nan, 'sortino': np.nan}
+
+    mean_r = sum_r / n
+    std_r = _sample_std(sum_r, sum_r2, n)
+    mean_e = sum_e / n
+    std_e = _sample_std(sum_e, sum_e2, n)
+
+    annualized_return = mean_r * annualization_factor
+    annualized_avg_excess = mean_e * annualization_factor
+
+    sharpe = np.nan
+    if std_r != 0 and not np.isnan(std_e):
+        sharpe = annualized_avg_excess / (std_e * np.sqrt(annualization_factor))
+
+    if max_dd == 0:
+        calmar = np.inf if mean_r > 0 else np.nan
+    else:
+        calmar = annualized_return / abs(max_dd)
+
+    if num_neg == 0:
+        sortino = np.inf
+    else:
+        downside_deviation = _sample_std(sum_neg, sum_neg2, num_neg)
+        if downside_deviation == 0:
+            sortino = np.inf if mean_e > 0 else np.nan
+        else:
+            sortino = annualized_avg_excess / (downside_deviation * np.sqrt(annualization_factor))
+
+    return {'cumulative_return': values[-1] / values[0],
+            'annualized_return': annualized_return,
+            'annualized_volatility': std_r * np.sqrt(annualization_factor),
+            'max_drawdown': max_dd,
+            'sharpe': sharpe,
+            'calmar': calmar,
+            'sortino': sortino}
 
 def calculate_returns(series: pd.Series) -> pd.Series:
     """Calculates daily percentage returns."""
@@ -91,6 +193,22 @@ def get_performance_summary(portfolio_values: pd.Series, benchmark_values: pd.Se
     """
     summary = {}
 
+    if NUMBA_AVAILABLE:
+        # One pass per series instead of separate pct_change / cummax /
+        # cumprod / mean / std traversals
+        strategy = _one_pass_summary(portfolio_values, risk_free_rate_annual)
+        benchmark = _one_pass_summary(benchmark_values, risk_free_rate_annual)
+        for name, key in [('Cumulative Return', 'cumulative_return'),
+                          ('Annualized Return', 'annualized_return'),
+                          ('Annualized Volatility', 'annualized_volatility'),
+                          ('Max Drawdown', 'max_drawdown'),
+                          ('Sharpe Ratio', 'sharpe'),
+                          ('Calmar Ratio', 'calmar'),
+                          ('Sortino Ratio', 'sortino')]:
+            summary[f'{name} (Strategy)'] = strategy[key]
+            summary[f'{name} (Benchmark)'] = benchmark[key]
+        return summary
+
     # Calculate daily returns
     portfolio_returns = calculate_returns(portfolio_values)
     benchmark_returns = calculate_returns(benchmark_values)
@@ -0,0 +1,27 @@
+"""
+Optional Numba support.
+
+Numba is an optional dependency: when it is installed, the numerical kernels
+in this package are JIT-compiled to machine code; when it is not, the same
+functions run as plain Python/NumPy. Import `njit` and `prange` from here so
+modules do not need their own try/except blocks.
+"""
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit when Numba is not installed."""
+        if args and callable(args[0]):
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+    def prange(*args):
+        """Falls back to a plain range when Numba is not installed."""
+        return range(*args)
@@ -1,28 +1,196 @@
+import logging
+
 import pandas as pd
 import numpy as np
 from scipy.optimize import minimize
 
-def calculate_covariance_matrix(returns: pd.DataFrame) -> pd.DataFrame:
+logger = logging.getLogger(__name__)
+
+
+class RollingCovState:
+    """
+    Incrementally maintained mean and covariance over a sliding window.
+
+    Recomputing lookback mean/covariance from scratch on every rebalance is
+    O(W*N^2); when the window just slides by one day, subtracting the oldest
+    row's contribution and adding the newest one's costs O(N^2). The window
+    rows live in an internal ring buffer, so callers only push the newest
+    return row via update().
+    """
+
+    def __init__(self, window_returns: np.ndarray):
+        window_returns = np.asarray(window_returns, dtype=np.float64)
+        self.window_size = window_returns.shape[0]
+        self._buffer = window_returns.copy()
+        self._oldest = 0
+        self._sum_r = window_returns.sum(axis=0)
+        self._sum_rr = window_returns.T @ window_returns
+
+    def update(self, new_row: np.ndarray):
+        """
+        Slides the window forward one step: drops the oldest return row and
+        adds the new one, updating the running sums in O(N^2).
+        """
+        new_row = np.asarray(new_row, dtype=np.float64)
+        old_row = self._buffer[self._oldest]
+        self._sum_r += new_row - old_row
+        self._sum_rr += np.outer(new_row, new_row) - np.outer(old_row, old_row)
+        self._buffer[self._oldest] = new_row
+        self._oldest = (self._oldest + 1) % self.window_size
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._sum_r / self.window_size
+
+    @property
+    def cov(self) -> np.ndarray:
+        """
+        Sample covariance of the current window (ddof=1, matching pandas).
+        """
+        w = self.window_size
+        mean = self.mean
+        return self._sum_rr / (w - 1) - (w / (w - 1)) * np.outer(mean, mean)
+
+
+def calculate_covariance_matrix(returns: pd.DataFrame) -> np.ndarray:
     """
-    Calculates the covariance matrix of asset returns.
+    Calculates the covariance matrix of asset returns as a plain (N, N)
+    ndarray. The optimizer only ever uses it as a matrix, so no index
+    machinery is attached; re-wrap with the asset symbols at the call site
+    if a labelled DataFrame is needed for display.
     """
     if returns.empty:
-        return pd.DataFrame()
-    cov_matrix = returns.cov()
-    return cov_matrix
+        return np.empty((0, 0))
+    # Layout invariant: the returns matrix is cast to Fortran order here
+    # because the covariance is a column-wise X'X GEMM, which BLAS consumes
+    # natively in F order (C-ordered input would be copied internally).
+    # Row-wise consumers like the rolling volatility kernel want C order
+    # instead - see market_analyzer.calculate_volatility.
+    returns_f = np.asfortranarray(returns.to_numpy(dtype=np.float64))
+    centered = returns_f - returns_f.mean(axis=0)
+    return centered.T @ centered / (len(returns_f) - 1)
 
-def calculate_expected_returns(returns: pd.DataFrame) -> pd.Series:
+def calculate_expected_returns(returns: pd.DataFrame) -> np.ndarray:
     """
-    Calculates the expected returns (mean of historical returns).
+    Calculates the expected returns (mean of historical returns) as a plain
+    (N,) ndarray in the column order of the input.
     """
     if returns.empty:
-        return pd.Series(dtype=float)
-    expected_returns = returns.mean()
-    return expected_returns
+        return np.array([])
+    return returns.to_numpy(dtype=np.float64).mean(axis=0)
+
+def _mvo_utility_closed_form(annual_mu: np.ndarray, annual_cov: np.ndarray,
+                             lambda_val: float, long_only: bool) -> np.ndarray:
+    """
+    Analytic solution of max w'mu - 0.5*lambda*w'Sigma*w subject to
+    sum(w) = 1 (and optionally w >= 0).
+
+    The equality-constrained problem is a linear KKT system. With the
+    long-only bound, the active set (the subset of assets with non-zero
+    weight) is unknown, but for a handful of assets all 2^N - 1 subsets can
+    be enumerated: solve the KKT system restricted to each subset, keep the
+    feasible solutions, and return the one with the highest utility. For
+    N = 6 that is 63 solves of at most a 7x7 system — far cheaper than an
+    iterative SLSQP run with Python callbacks per evaluation.
+
+    Returns None if no feasible stationary point is found (e.g. a singular
+    covariance matrix), in which case the caller falls back to SLSQP.
+    """
+    num_assets = len(annual_mu)
+    if lambda_val <= 0:
+        return None
+
+    def solve_support(support: np.ndarray):
+        # KKT system: lambda*Sigma_S @ w_S - nu*1 = mu_S,  1'w_S = 1
+        k = len(support)
+        kkt = np.empty((k + 1, k + 1))
+        kkt[:k, :k] = lambda_val * annual_cov[np.ix_(support, support)]
+        kkt[:k, k] = -1.0
+        kkt[k, :k] = 1.0
+        kkt[k, k] = 0.0
+        rhs = np.empty(k + 1)
+        rhs[:k] = annual_mu[support]
+        rhs[k] = 1.0
+        try:
+            solution = np.linalg.solve(kkt, rhs)
+        except np.linalg.LinAlgError:
+            return None
+        return solution[:k]
+
+    if not long_only:
+        full_support = np.arange(num_assets)
+        weights_s = solve_support(full_support)
+        if weights_s is None:
+            return None
+        return weights_s
+
+    best_weights = None
+    best_utility = -np.inf
+    for mask in range(1, 1 << num_assets):
+        support = np.flatnonzero([(mask >> j) & 1 for j in range(num_assets)])
+        weights_s = solve_support(support)
+        if weights_s is None or (weights_s < -1e-10).any():
+            continue
+        weights = np.zeros(num_assets)
+        weights[support] = np.clip(weights_s, 0.0, None)
+        utility = weights @ annual_mu - 0.5 * lambda_val * (weights @ annual_cov @ weights)
+        if utility > best_utility:
+            best_utility = utility
+            best_weights = weights
+    return best_weights
+
+
+def _mvo_target_risk_closed_form(annual_mu: np.ndarray, annual_cov: np.ndarray,
+                                 target_risk: float, long_only: bool) -> np.ndarray:
+    """
+    Analytic fully-invested frontier portfolio at a target volatility.
+
+    By the two-fund theorem every frontier portfolio is the minimum-variance
+    portfolio plus a step along a self-financing excess-return direction d
+    (with 1'd = 0, so the sum-to-one constraint is preserved and the
+    variance decomposes as var_mvp + gamma^2 * d'Sigma*d). Solving for gamma
+    that hits the target variance takes two linear solves instead of an
+    SLSQP run. If the target volatility is below the minimum-variance
+    portfolio's, the minimum-variance portfolio is returned.
+
+    The two-fund theorem only covers the unconstrained frontier: with
+    long_only set and any asset shorted, clipping the weights would leave
+    the portfolio off the frontier and off the target risk, so None is
+    returned and the bounded SLSQP fallback solves the constrained problem.
+    Also returns None when the covariance matrix is singular.
+    """
+    ones = np.ones(len(annual_mu))
+    try:
+        inv_cov_ones = np.linalg.solve(annual_cov, ones)
+        inv_cov_mu = np.linalg.solve(annual_cov, annual_mu)
+    except np.linalg.LinAlgError:
+        return None
+
+    denom = ones @ inv_cov_ones
+    if denom <= 0:
+        return None
+    w_mvp = inv_cov_ones / denom
+    var_mvp = 1.0 / denom
+
+    # Excess-return direction orthogonal to the budget constraint (1'd = 0)
+    direction = inv_cov_mu - (ones @ inv_cov_mu / denom) * inv_cov_ones
+    dir_var = direction @ annual_cov @ direction
+
+    target_var = target_risk ** 2
+    if target_var <= var_mvp or dir_var <= 0:
+        weights = w_mvp
+    else:
+        gamma = np.sqrt((target_var - var_mvp) / dir_var)
+        weights = w_mvp + gamma * direction
+
+    if long_only and (weights < -1e-10).any():
+        return None
+    return weights
+
 
 def mean_variance_optimization(
-    expected_returns: pd.Series,
-    cov_matrix: pd.DataFrame,
+    expected_returns: np.ndarray,
+    cov_matrix: np.ndarray,
     target_risk: float = None, # Annualized target volatility
     risk_aversion_lambda: float = None, # Lambda for risk aversion in utility optimization
     constraints: dict = None
@@ -32,8 +200,10 @@ def mean_variance_optimization(
     Can optimize for a target risk or maximize utility with a risk aversion lambda.
     
     Args:
-        expected_returns (pd.Series): Expected returns for each asset.
-        cov_matrix (pd.DataFrame): Covariance matrix of asset returns.
+        expected_returns (np.ndarray): Expected returns for each asset
+                                       (a pd.Series is also accepted).
+        cov_matrix (np.ndarray): Covariance matrix of asset returns
+                                 (a pd.DataFrame is also accepted).
         target_risk (float): Annualized target volatility for the portfolio. If provided, optimizes to meet this.
         risk_aversion_lambda (float): Lambda parameter for utility maximization (U = E[R] - 0.5 * lambda * sigma^2).
                                       If provided, maximizes utility.
@@ -47,57 +217,75 @@ def mean_variance_optimization(
     num_assets = len(expected_returns)
     if num_assets == 0:
         return np.array([])
-        
+
     initial_weights = np.ones(num_assets) / num_assets
 
-    # Annualization factor for daily data 
+    # Annualization factor for daily data
     annualization_factor = 252 # Typical for equities/bonds, use 365 for crypto if returns are daily calendar
     # Let's assume input returns are daily.
     annual_expected_returns = expected_returns * annualization_factor
     annual_cov_matrix = cov_matrix * annualization_factor
 
-    # Define objective function based on the optimization goal
+    # Plain float64 arrays for the analytic solvers
+    annual_mu = np.asarray(annual_expected_returns, dtype=np.float64)
+    annual_sigma = np.asarray(annual_cov_matrix, dtype=np.float64)
+    long_only = bool(constraints and constraints.get('long_only', False))
+
+    # Try the closed-form solvers first: both problems reduce to a few small
+    # linear solves, so no iterative SLSQP run (with a Python callback per
+    # evaluation) is needed unless the covariance matrix is degenerate.
     if target_risk is not None:
-        # Objective: Minimize volatility while achieving target risk.
-        # This becomes a constrained optimization where target_risk is a constraint.
-        def portfolio_variance(weights, cov_mat):
-            return np.sqrt(weights.T @ cov_mat @ weights) # Annualized Std Dev
-
-        # Target risk as a constraint: sqrt(w'Sigma w) - target_risk = 0
-        cons = ({'type': 'eq', 'fun': lambda w: np.sum(w) - 1}, # Sum of weights = 1
-                {'type': 'eq', 'fun': lambda w: portfolio_variance(w, annual_cov_matrix) - target_risk})
-        
-        # Maximize return given target risk (or minimize variance for given return & target risk)
-        # Here, let's just minimize variance (portfolio_variance) subject to constraints
-        objective_function = lambda w: portfolio_variance(w, annual_cov_matrix)
-        
+        optimal_weights = _mvo_target_risk_closed_form(annual_mu, annual_sigma, target_risk, long_only)
     elif risk_aversion_lambda is not None:
-        # Objective: Maximize utility (expected return - risk aversion * variance)
-        def utility_function(weights, exp_ret, cov_mat, lambda_val):
-            port_return = weights.T @ exp_ret
-            port_variance = weights.T @ cov_mat @ weights
-            return -(port_return - 0.5 * lambda_val * port_variance) # Negative to minimize
-        
-        objective_function = lambda w: utility_function(w, annual_expected_returns, annual_cov_matrix, risk_aversion_lambda)
-        
-        # Define base constraints for utility maximization
-        cons = ({'type': 'eq', 'fun': lambda w: np.sum(w) - 1}) # Sum of weights = 1
+        optimal_weights = _mvo_utility_closed_form(annual_mu, annual_sigma, risk_aversion_lambda, long_only)
     else:
         raise ValueError("Either 'target_risk' or 'risk_aversion_lambda' must be provided.")
 
+    if optimal_weights is not None:
+        # Normalize weights to ensure they sum to 1 due to potential float inaccuracies
+        optimal_weights = np.clip(optimal_weights, 0, 1) # Ensure non-negative and <=1
+        if np.sum(optimal_weights) != 0:
+            optimal_weights = optimal_weights / np.sum(optimal_weights)
+        else:
+            optimal_weights = np.ones(num_assets) / num_assets # Fallback
+        return optimal_weights
+
+    logger.debug("Closed form not applicable (active bound or singular covariance), falling back to SLSQP.")
+
+    # Annualized inputs as contiguous float64 arrays, computed once: every
+    # SLSQP evaluation below is then a plain BLAS matrix-vector call with no
+    # pandas or layout conversion inside the hot callbacks.
+    annual_mu = np.ascontiguousarray(annual_mu)
+    annual_sigma = np.ascontiguousarray(annual_sigma)
+
+    sum_to_one = {'type': 'eq', 'fun': lambda w: np.sum(w) - 1,
+                  'jac': lambda w: np.ones(num_assets)}
+
+    # Define objective function based on the optimization goal. Analytic
+    # jacobians are supplied throughout so SLSQP does not need N+1
+    # finite-difference objective evaluations per step.
+    if target_risk is not None:
+        # Objective: Minimize variance while achieving target risk. The
+        # target-risk constraint is written on the variance, w'Sigma w -
+        # target^2 = 0: a smooth quadratic, unlike the volatility form whose
+        # sqrt has an unbounded derivative near zero.
+        objective_function = lambda w: w @ annual_sigma @ w
+        objective_jac = lambda w: 2.0 * (annual_sigma @ w)
+        cons = (sum_to_one,
+                {'type': 'eq', 'fun': lambda w: w @ annual_sigma @ w - target_risk ** 2,
+                 'jac': lambda w: 2.0 * (annual_sigma @ w)})
+    else:
+        # Objective: Maximize utility (expected return - risk aversion * variance)
+        objective_function = lambda w: -(w @ annual_mu - 0.5 * risk_aversion_lambda * (w @ annual_sigma @ w))
+        objective_jac = lambda w: -(annual_mu - risk_aversion_lambda * (annual_sigma @ w))
+        cons = (sum_to_one,)
+
     # Define bounds: long-only (weights >= 0) if specified, otherwise no bounds.
-    bounds = tuple((0, 1) for _ in range(num_assets)) if constraints and constraints.get('long_only', False) else None
-    
-    # Add sum_to_one constraint if not already added
-    if constraints and constraints.get('sum_to_one', False) and not (target_risk is not None and len(cons) > 0 and cons[0]['fun'](initial_weights) == 0):
-         # If target_risk is used, the sum_to_one is already there. Otherwise, add it.
-        if target_risk is None: # Only add if we're not using the target_risk constraint which already includes sum_to_one
-            cons = list(cons) if cons else []
-            cons.append({'type': 'eq', 'fun': lambda w: np.sum(w) - 1})
-            cons = tuple(cons)
+    bounds = tuple((0, 1) for _ in range(num_assets)) if long_only else None
 
     try:
-        result = minimize(objective_function, initial_weights, method='SLSQP', bounds=bounds, constraints=cons)
+        result = minimize(objective_function, initial_weights, method='SLSQP', jac=objective_jac,
+                          bounds=bounds, constraints=cons)
         if result.success:
             optimal_weights = result.x
             # Normalize weights to ensure they sum to 1 due to potential float inaccuracies
@@ -108,8 +296,8 @@ def mean_variance_optimization(
                 optimal_weights = np.ones(num_assets) / num_assets # Fallback
             return optimal_weights
         else:
-            print(f"Optimization failed: {result.message}")
+            logger.warning(f"Optimization failed: {result.message}")
             return np.ones(num_assets) / num_assets # Fallback to equal weights
     except Exception as e:
-        print(f"Error during optimization: {e}")
+        logger.warning(f"Error during optimization: {e}")
         return np.ones(num_assets)
\ No newline at end of file
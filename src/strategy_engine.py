@@ -1,37 +1,62 @@
+import logging
+
 import pandas as pd
 import numpy as np
 from config import settings
-from src.portfolio_optimizer import mean_variance_optimization # Import the optimizer
+from src.portfolio_optimizer import (
+    mean_variance_optimization, RollingCovState,
+    calculate_expected_returns, calculate_covariance_matrix
+) # Import the optimizer
+from src.market_analyzer import REGIME_LOW_VOL, REGIME_HIGH_VOL, REGIME_CODES
+
+try:
+    from joblib import Parallel, delayed
+    JOBLIB_AVAILABLE = True
+except ImportError:
+    JOBLIB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 def generate_regime_specific_weights(
-    current_regime: str,
+    current_regime: int,
     lookback_returns: pd.DataFrame,
-    initial_weights: np.ndarray = None # For warm-starting optimization
+    initial_weights: np.ndarray = None, # For warm-starting optimization
+    cov_state: RollingCovState = None # Incrementally maintained mean/cov for the window
 ) -> np.ndarray:
 
+    # Accept legacy string labels, but dispatch on the integer regime codes
+    if isinstance(current_regime, str):
+        current_regime = REGIME_CODES[current_regime]
+
     num_assets = lookback_returns.shape[1]
     # Default to equal weights if no specific strategy is defined for a regime
     weights = np.ones(num_assets) / num_assets
 
     if lookback_returns.empty:
-        print(f"Warning: No lookback returns for regime {current_regime}. Returning equal weights.")
+        logger.warning(f"No lookback returns for regime {current_regime}. Returning equal weights.")
         return weights
 
 
-    expected_returns = lookback_returns.mean()
-    cov_matrix = lookback_returns.cov()
+    if cov_state is not None:
+        # Reuse the incrementally updated moments instead of recomputing
+        # them from the full window on every rebalance
+        expected_returns = cov_state.mean
+        cov_matrix = cov_state.cov
+    else:
+        expected_returns = calculate_expected_returns(lookback_returns)
+        cov_matrix = calculate_covariance_matrix(lookback_returns)
 
-    if current_regime == 'High_Vol':
+    if current_regime == REGIME_HIGH_VOL:
         # Example: In high vol, might target lower risk or shift to less correlated assets
-        print(f"Generating weights for HIGH VOLATILITY regime.")
+        logger.debug(f"Generating weights for HIGH VOLATILITY regime.")
 
         weights = mean_variance_optimization(
             expected_returns, cov_matrix, target_risk=settings.TARGET_RISK_ANNUAL * 0.5,
             constraints={'sum_to_one': True, 'long_only': True}
         )
-    elif current_regime == 'Low_Vol':
+    elif current_regime == REGIME_LOW_VOL:
         # Example: In low vol, might increase equity exposure or target higher risk
-        print(f"Generating weights for LOW VOLATILITY regime.")
+        logger.debug(f"Generating weights for LOW VOLATILITY regime.")
 
         weights = mean_variance_optimization(
             expected_returns, cov_matrix, risk_aversion_lambda=settings.LAMBDA_RISK_AVERSION * 1.5,
@@ -39,7 +64,7 @@ def generate_regime_specific_weights(
         )
     else: # 'Normal_Vol'
         # Example: Standard mean-variance optimization
-        print(f"Generating weights for NORMAL VOLATILITY regime.")
+        logger.debug(f"Generating weights for NORMAL VOLATILITY regime.")
         weights = mean_variance_optimization(
             expected_returns, cov_matrix, risk_aversion_lambda=settings.LAMBDA_RISK_AVERSION,
             constraints={'sum_to_one': True, 'long_only': True}
@@ -50,6 +75,64 @@ def generate_regime_specific_weights(
         weights = weights / np.sum(weights) # Re-normalize if needed
     else: # Fallback if optimization fails to produce valid weights
         weights = np.ones(num_assets) / num_assets
-        print("Warning: Optimization failed or resulted in zero sum, defaulting to equal weights.")
+        logger.warning("Optimization failed or resulted in zero sum, defaulting to equal weights.")
 
     return weights
+
+
+def generate_weight_schedule(
+    df_returns: pd.DataFrame,
+    regimes: pd.Series,
+    optimization_window: int = settings.OPTIMIZATION_WINDOW,
+    n_jobs: int = None
+) -> pd.DataFrame:
+    """
+    Generates the optimal-weight schedule for every date in `regimes`.
+
+    Each date's optimization only depends on its own lookback window (the
+    `optimization_window` return rows strictly before the date, so there is
+    no look-ahead), never on earlier weights - the dates are embarrassingly
+    parallel. With joblib installed and n_jobs != 1 (default from
+    settings.N_JOBS_WEIGHT_GENERATION / the OPTIMIZER_N_JOBS environment
+    variable) the per-date optimizations are spread across worker processes.
+    The sequential path instead slides a RollingCovState across consecutive
+    dates, so each step updates the lookback mean/covariance in O(N^2)
+    rather than recomputing them from the full window.
+    """
+    positions = df_returns.index.get_indexer(regimes.index)
+
+    tasks = []
+    dates = []
+    for date, regime, pos in zip(regimes.index, regimes.to_numpy(), positions):
+        if pos < optimization_window: # Not enough history yet (or date missing, pos == -1)
+            continue
+        tasks.append((int(regime), df_returns.iloc[pos - optimization_window:pos], int(pos)))
+        dates.append(date)
+
+    if not tasks:
+        logger.warning("No dates with a full lookback window, empty weight schedule.")
+        return pd.DataFrame(columns=df_returns.columns)
+
+    if n_jobs is None:
+        n_jobs = settings.N_JOBS_WEIGHT_GENERATION
+
+    if JOBLIB_AVAILABLE and n_jobs != 1 and len(tasks) > 1:
+        all_weights = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(generate_regime_specific_weights)(regime, lookback) for regime, lookback, _ in tasks
+        )
+    else:
+        returns_arr = df_returns.to_numpy(dtype=np.float64)
+        all_weights = []
+        cov_state = None
+        prev_pos = None
+        for regime, lookback, pos in tasks:
+            if cov_state is None or pos != prev_pos + 1:
+                # First date, or a gap in the schedule: (re)build from scratch
+                cov_state = RollingCovState(returns_arr[pos - optimization_window:pos])
+            else:
+                # Window slid forward one row: O(N^2) incremental update
+                cov_state.update(returns_arr[pos - 1])
+            prev_pos = pos
+            all_weights.append(generate_regime_specific_weights(regime, lookback, cov_state=cov_state))
+
+    return pd.DataFrame(np.vstack(all_weights), index=pd.DatetimeIndex(dates), columns=df_returns.columns)